@@ -90,6 +90,18 @@ function toDate(str) {
   return new Date(str.replace(/\./g, '-'));
 }
 
+function collapseDuplicates(results) {
+  const seen = new Set();
+  return results.filter(e => {
+    const cluster = e.cluster_id || e.id;
+    if(!cluster) return true;
+    const key = `${e.municipality}\u0000${cluster}`;
+    if(seen.has(key)) return false;
+    seen.add(key);
+    return true;
+  });
+}
+
 async function search(entries, q) {
   const {keywords, order} = parseQuery(q.trim());
   if(!keywords.length) {
@@ -104,6 +116,8 @@ async function search(entries, q) {
     debug('Sorting results');
     results.sort((a,b) => order === 'desc' ? toDate(b.date) - toDate(a.date) : toDate(a.date) - toDate(b.date));
   }
+  results = collapseDuplicates(results);
+  debug('Results after collapsing duplicates', results.length);
   return results;
 }
 
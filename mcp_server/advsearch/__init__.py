@@ -1,17 +1,21 @@
 import json
 import os
 import re
-import pandas as pd
 import subprocess
 import requests
 import datetime
 import azure.functions as func
 
+from ..shared_code import metrics
+from ..shared_code.articles import collapse_duplicates, markdown_response
+
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 INDEX_PATH = os.path.join(BASE_DIR, 'docs', 'index.json')
 CSV_DIR = os.path.join(BASE_DIR, 'csv')
 PROMPT_PATH = os.path.join(BASE_DIR, '.github', 'models', 'extract.prompt.yaml')
 REPO = os.getenv('REPO', 'Mitsuo-Koikawa/Municipal-Bulletin')
+MAX_RESULTS = 20
+MAX_BULK_RESULTS = 500  # bulk=1 指定時（Markdownのみ）
 
 with open(INDEX_PATH, 'r', encoding='utf-8') as f:
     INDEX = json.load(f)
@@ -49,6 +53,7 @@ def run_slm(text: str):
             return tags
     except Exception as e:
         print('slm error', e)
+        metrics.inc('slm_errors_total', function='advsearch')
     return []
 
 def expand_groups(words):
@@ -66,29 +71,12 @@ def entry_matches(entry, groups):
     ])
     return all(includes_any(text, g) for g in groups)
 
-def search_entries(entries, q):
-    words = run_slm(q.strip())
+def match_entries(entries, words):
     if not words:
         return []
     groups = expand_groups(words)
     return [e for e in entries if entry_matches(e, groups)]
 
-def fetch_article(entry):
-    path = os.path.join(BASE_DIR, entry['source'])
-    df = pd.read_csv(path)
-    row = df.iloc[entry['row'] - 1]
-    return row.get('記事本文', '')
-
-def create_markdown(entry, article):
-    return f"# {entry['article_title']}\n\n- 自治体: {entry['municipality']}\n- 日付: {entry['date']}\n- 号: {entry['issue_title']}\n- カテゴリ: {entry['category']}\n\n{article}"
-
-def build_markdown(results):
-    out = ''
-    for e in results:
-        article = fetch_article(e)
-        out += create_markdown(e, article) + '\n\n'
-    return out.strip()
-
 def append_log(user: str, query: str):
     gist = os.getenv('LOG_GIST_ID')
     token = os.getenv('GH_TOKEN')
@@ -107,6 +95,7 @@ def append_log(user: str, query: str):
         requests.patch(url, headers=headers, json=patch)
     except Exception as e:
         print('log error', e)
+        metrics.inc('gist_log_errors_total', function='advsearch')
 
 def is_collaborator(username: str) -> bool:
     token = os.getenv('GH_TOKEN')
@@ -118,31 +107,41 @@ def is_collaborator(username: str) -> bool:
     return r.status_code == 204
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
+    timer = metrics.RequestTimer('advsearch')
     auth = req.headers.get('Authorization')
     if not auth or not auth.startswith('Bearer '):
-        return func.HttpResponse('unauthorized', status_code=401)
+        return timer.finish(func.HttpResponse('unauthorized', status_code=401))
     token = auth.split(' ', 1)[1]
-    user = github_user(token)
+    with timer.span('auth'):
+        user = github_user(token)
+        allowed = bool(user) and is_collaborator(user.get('login'))
     if not user:
-        return func.HttpResponse('unauthorized', status_code=401)
-    if not is_collaborator(user.get('login')):
-        return func.HttpResponse('forbidden', status_code=403)
+        return timer.finish(func.HttpResponse('unauthorized', status_code=401))
+    if not allowed:
+        return timer.finish(func.HttpResponse('forbidden', status_code=403))
 
     if req.params.get('check'):
-        return func.HttpResponse(status_code=204)
+        return timer.finish(func.HttpResponse(status_code=204))
 
     q = req.params.get('q') or req.get_json().get('q') if req.get_body() else None
     if not q:
-        return func.HttpResponse('missing query', status_code=400)
-
-    results = search_entries(INDEX, q)
-    limited = results[:20]
+        return timer.finish(func.HttpResponse('missing query', status_code=400))
+
+    with timer.span('slm'):
+        words = run_slm(q.strip())
+    with timer.span('match'):
+        results = match_entries(INDEX, words)
+        if req.params.get('dedup') != '0':
+            results = collapse_duplicates(results)
     format_md = req.params.get('format') == 'markdown'
-    append_log(user.get('login'), q)
+    with timer.span('log'):
+        append_log(user.get('login'), q)
 
     if format_md:
-        md = build_markdown(limited)
-        return func.HttpResponse(md, mimetype='text/markdown')
+        bulk = req.params.get('bulk') in ('1', 'true')
+        with timer.span('render'):
+            resp = markdown_response(req, results[:MAX_BULK_RESULTS if bulk else MAX_RESULTS], 'advsearch', bulk, timer)
+        return timer.finish(resp)
     else:
-        body = json.dumps(limited, ensure_ascii=False)
-        return func.HttpResponse(body, mimetype='application/json')
+        body = json.dumps(results[:MAX_RESULTS], ensure_ascii=False)
+        return timer.finish(func.HttpResponse(body, mimetype='application/json'))
@@ -0,0 +1,7 @@
+import azure.functions as func
+
+from ..shared_code import metrics
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    return func.HttpResponse(metrics.render(), mimetype='text/plain; version=0.0.4')
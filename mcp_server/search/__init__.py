@@ -5,11 +5,15 @@ import pandas as pd
 import azure.functions as func
 from typing import List, Tuple, Optional, Any
 
+from ..shared_code import metrics
+from ..shared_code.articles import collapse_duplicates, markdown_response
+
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 INDEX_PATH = os.path.join(BASE_DIR, 'docs', 'index.json')
 CSV_DIR = os.path.join(BASE_DIR, 'csv')
 MAX_QUERY_LENGTH = 100  # クエリ最大長
 MAX_RESULTS = 20        # 最大返却件数
+MAX_BULK_RESULTS = 500  # bulk=1 指定時の最大返却件数（Markdownのみ）
 
 # INDEXのロード
 try:
@@ -98,28 +102,9 @@ def search_entries(entries: List[dict], q: str) -> List[dict]:
         results.sort(key=lambda e: to_date(e['date']), reverse=(order == 'desc'))
     return results
 
-def fetch_article(entry: dict) -> str:
-    """CSVから記事本文を取得"""
-    try:
-        path = os.path.join(BASE_DIR, entry['source'])
-        df = pd.read_csv(path)
-        row = df.iloc[entry['row'] - 1]
-        return row.get('記事本文', '')
-    except Exception:
-        return ''
-
-def create_markdown(entry: dict, article: str) -> str:
-    return f"# {entry['article_title']}\n\n- 自治体: {entry['municipality']}\n- 日付: {entry['date']}\n- 号: {entry['issue_title']}\n- カテゴリ: {entry['category']}\n\n{article}"
-
-def build_markdown(results: List[dict]) -> str:
-    out = ''
-    for e in results:
-        article = fetch_article(e)
-        out += create_markdown(e, article) + '\n\n'
-    return out.strip()
-
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """HTTPリクエストのエントリポイント"""
+    timer = metrics.RequestTimer('search')
     try:
         q = req.params.get('q')
         if not q and req.get_body():
@@ -129,15 +114,19 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 q = None
         q = validate_query(q)
         if not q:
-            return func.HttpResponse('Invalid or missing query', status_code=400)
-        results = search_entries(INDEX, q)
+            return timer.finish(func.HttpResponse('Invalid or missing query', status_code=400))
+        with timer.span('match'):
+            results = search_entries(INDEX, q)
+            if req.params.get('dedup') != '0':
+                results = collapse_duplicates(results)
         format_md = req.params.get('format') == 'markdown'
-        limited = results[:MAX_RESULTS]
         if format_md:
-            md = build_markdown(limited)
-            return func.HttpResponse(md, mimetype='text/markdown')
-        else:
-            body = json.dumps(limited, ensure_ascii=False)
-            return func.HttpResponse(body, mimetype='application/json')
+            bulk = req.params.get('bulk') in ('1', 'true')
+            limited = results[:MAX_BULK_RESULTS if bulk else MAX_RESULTS]
+            with timer.span('render'):
+                resp = markdown_response(req, limited, 'search', bulk, timer)
+            return timer.finish(resp)
+        body = json.dumps(results[:MAX_RESULTS], ensure_ascii=False)
+        return timer.finish(func.HttpResponse(body, mimetype='application/json'))
     except Exception as e:
-        return func.HttpResponse(f'Internal server error: {str(e)}', status_code=500)
+        return timer.finish(func.HttpResponse(f'Internal server error: {str(e)}', status_code=500))
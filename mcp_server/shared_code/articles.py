@@ -0,0 +1,159 @@
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import azure.functions as func
+import pandas as pd
+
+from . import metrics
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+MAX_BULK_BYTES = 20 * 1024 * 1024  # bulk出力のMarkdown本体の上限（バイト）
+FETCH_WORKERS = 4                  # 本文取得の並列数
+
+
+def collapse_duplicates(results: List[dict]) -> List[dict]:
+    """同じ自治体で同じ cluster_id を持つ重複記事は最初の1件だけ残す（他自治体の記事は残す）"""
+    seen = set()
+    out = []
+    for e in results:
+        cluster = e.get('cluster_id') or e.get('id')
+        if cluster:
+            key = (e.get('municipality', ''), cluster)
+            if key in seen:
+                continue
+            seen.add(key)
+        out.append(e)
+    return out
+
+
+def read_articles(source: str, rows: Iterable[int], function: str,
+                  timer: Optional[metrics.RequestTimer] = None) -> Dict[int, str]:
+    """1つのCSVから指定行の記事本文をまとめて取得"""
+    try:
+        path = os.path.join(BASE_DIR, source)
+        with metrics.timed('csv_read', function=function), \
+                (timer.accumulate('csv') if timer else nullcontext()):
+            df = pd.read_csv(path, usecols=lambda c: c == '記事本文')
+    except Exception:
+        metrics.inc('csv_read_errors_total', function=function)
+        return {}
+    articles = {}
+    for r in rows:
+        try:
+            value = df.iloc[r - 1].get('記事本文', '')
+        except Exception:
+            value = ''
+        articles[r] = '' if pd.isna(value) else str(value)
+    return articles
+
+
+def group_by_source(entries: List[dict]) -> Dict[str, List[dict]]:
+    groups: Dict[str, List[dict]] = {}
+    for e in entries:
+        groups.setdefault(e.get('source', ''), []).append(e)
+    return groups
+
+
+def fetch_articles(entries: List[dict], function: str, timer: Optional[metrics.RequestTimer] = None) -> List[str]:
+    """記事本文をCSVごとにまとめて並列取得（各CSVは1回だけ開く）"""
+    groups = group_by_source(entries)
+    if not groups:
+        return []
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(groups))) as ex:
+        futures = {
+            src: ex.submit(read_articles, src, [e.get('row', 0) for e in es], function, timer)
+            for src, es in groups.items()
+        }
+        found = {src: f.result() for src, f in futures.items()}
+    return [found[e.get('source', '')].get(e.get('row', 0), '') for e in entries]
+
+
+def iter_articles_by_source(entries: List[dict], function: str,
+                            timer: Optional[metrics.RequestTimer] = None) -> Iterator[Tuple[dict, str]]:
+    """CSVを1つずつ（先読みはFETCH_WORKERS件まで）読み、そのCSVの記事を結果順に返す"""
+    groups = group_by_source(entries)
+    sources = iter(groups)
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+        def submit(src):
+            return src, ex.submit(read_articles, src, [e.get('row', 0) for e in groups[src]], function, timer)
+        pending = deque(submit(src) for _, src in zip(range(FETCH_WORKERS), sources))
+        while pending:
+            src, future = pending.popleft()
+            articles = future.result()
+            nxt = next(sources, None)
+            if nxt is not None:
+                pending.append(submit(nxt))
+            for e in groups[src]:
+                yield e, articles.get(e.get('row', 0), '')
+
+
+def create_markdown(entry: dict, article: str) -> str:
+    return f"# {entry['article_title']}\n\n- 自治体: {entry['municipality']}\n- 日付: {entry['date']}\n- 号: {entry['issue_title']}\n- カテゴリ: {entry['category']}\n\n{article}"
+
+
+def iter_markdown(results: List[dict], function: str, bulk: bool = False,
+                  timer: Optional[metrics.RequestTimer] = None) -> Iterator[bytes]:
+    """MarkdownをUTF-8で順に返す。
+
+    bulk=True ではCSVごとにまとめて出力し（同じCSVの記事は結果順）、
+    合計が MAX_BULK_BYTES を超える手前で打ち切る。
+    """
+    if bulk:
+        pairs = iter_articles_by_source(results, function, timer)
+    else:
+        pairs = zip(results, fetch_articles(results, function, timer))
+    sep = b''
+    total = 0
+    for e, article in pairs:
+        md = sep + create_markdown(e, article).encode('utf-8')
+        total += len(md)
+        if bulk and total > MAX_BULK_BYTES:
+            break
+        yield md
+        sep = b'\n\n'
+
+
+def build_markdown(results: List[dict], function: str, bulk: bool = False,
+                   timer: Optional[metrics.RequestTimer] = None) -> bytes:
+    """Markdown全体をUTF-8のバイト列で返す（記事間の区切りのみで、前後に余分な改行はない）"""
+    return b''.join(iter_markdown(results, function, bulk, timer))
+
+
+def gzip_markdown(results: List[dict], function: str, bulk: bool = False,
+                  timer: Optional[metrics.RequestTimer] = None) -> bytes:
+    """Markdownを逐次gzip圧縮する（圧縮後のレスポンス全体はメモリに保持される）"""
+    comp = zlib.compressobj(wbits=31)
+    parts = [comp.compress(md) for md in iter_markdown(results, function, bulk, timer)]
+    parts.append(comp.flush())
+    return b''.join(parts)
+
+
+def accepts_gzip(req: func.HttpRequest) -> bool:
+    """Accept-Encoding を解釈し、gzip（または *）が q>0 で許可されているか"""
+    qvalues = {}
+    for token in (req.headers.get('Accept-Encoding') or '').split(','):
+        name, *params = [p.strip() for p in token.split(';')]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            qvalues[name.lower()] = q
+    return qvalues.get('gzip', qvalues.get('*', 0.0)) > 0
+
+
+def markdown_response(req: func.HttpRequest, results: List[dict], function: str,
+                      bulk: bool = False, timer: Optional[metrics.RequestTimer] = None) -> func.HttpResponse:
+    """timer を渡すとCSV読み込みの合計時間を Server-Timing の csv ステージに記録する"""
+    if accepts_gzip(req):
+        headers = {'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'}
+        return func.HttpResponse(gzip_markdown(results, function, bulk, timer), mimetype='text/markdown', headers=headers)
+    return func.HttpResponse(build_markdown(results, function, bulk, timer), mimetype='text/markdown', charset='utf-8')
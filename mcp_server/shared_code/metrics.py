@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+import azure.functions as func
+
+PREFIX = 'mcp_'
+# Prometheus のデフォルトと同じバケット（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# 値はワーカープロセスごとのメモリに保持されるため、全系列にインスタンスとPIDを付与する
+INSTANCE_LABELS: Labels = (
+    ('instance', os.getenv('WEBSITE_INSTANCE_ID', 'local')),
+    ('pid', str(os.getpid())),
+)
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Labels], float] = {}
+_histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels: str) -> None:
+    """カウンタを加算"""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    """ヒストグラムに値を記録（バケット毎の件数 + 合計 + 件数）"""
+    key = (name, _labels(labels))
+    with _lock:
+        h = _histograms.setdefault(key, [0.0] * (len(BUCKETS) + 2))
+        for i, b in enumerate(BUCKETS):
+            if value <= b:
+                h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+
+@contextmanager
+def timed(name: str, **labels: str) -> Iterator[None]:
+    """ブロックの所要時間を `<name>_seconds` ヒストグラムに記録"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(f'{name}_seconds', time.perf_counter() - start, **labels)
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = labels + INSTANCE_LABELS + extra
+    body = ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"')) for k, v in items)
+    return '{' + body + '}'
+
+
+def _format_value(value: float) -> str:
+    """件数は整数のまま、それ以外は精度を落とさずに出力（:g は6桁で指数表記になる）"""
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render() -> str:
+    """Prometheus テキスト形式 (0.0.4) で出力"""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, list(v)) for k, v in _histograms.items())
+    lines = []
+    seen = set()
+    for (name, labels), value in counters:
+        metric = PREFIX + name
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric}{_format_labels(labels)} {_format_value(value)}')
+    for (name, labels), h in histograms:
+        metric = PREFIX + name
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f'# TYPE {metric} histogram')
+        for b, n in zip(BUCKETS, h):
+            lines.append(f'{metric}_bucket{_format_labels(labels, (("le", f"{b:g}"),))} {_format_value(n)}')
+        lines.append(f'{metric}_bucket{_format_labels(labels, (("le", "+Inf"),))} {_format_value(h[-1])}')
+        lines.append(f'{metric}_sum{_format_labels(labels)} {h[-2]:.6f}')
+        lines.append(f'{metric}_count{_format_labels(labels)} {_format_value(h[-1])}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestTimer:
+    """1リクエスト内の各ステージを計測し、Server-Timing ヘッダとメトリクスに反映する"""
+
+    def __init__(self, function: str):
+        self.function = function
+        self.start = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self.spans.append((stage, duration))
+            observe('stage_duration_seconds', duration, function=self.function, stage=stage)
+
+    @contextmanager
+    def accumulate(self, stage: str) -> Iterator[None]:
+        """ステージの所要時間を加算する（並列スレッドからの呼び出し可。合計なので実時間を超えうる）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                for i, (name, d) in enumerate(self.spans):
+                    if name == stage:
+                        self.spans[i] = (name, d + duration)
+                        break
+                else:
+                    self.spans.append((stage, duration))
+
+    def server_timing(self) -> str:
+        total = time.perf_counter() - self.start
+        with self._lock:
+            spans = self.spans + [('total', total)]
+        return ', '.join(f'{stage};dur={d * 1000:.1f}' for stage, d in spans)
+
+    def finish(self, resp: func.HttpResponse) -> func.HttpResponse:
+        """レスポンスに Server-Timing を付与し、リクエスト数と所要時間を記録"""
+        resp.headers['Server-Timing'] = self.server_timing()
+        inc('requests_total', function=self.function, status=str(resp.status_code))
+        observe('request_duration_seconds', time.perf_counter() - self.start, function=self.function)
+        return resp
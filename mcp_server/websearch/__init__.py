@@ -3,6 +3,8 @@ import os
 import azure.functions as func
 from typing import Any, List
 
+from ..shared_code import metrics
+
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 INDEX_PATH = os.path.join(BASE_DIR, 'docs', 'crawl_index.json')
 
@@ -35,6 +37,7 @@ def search_entries(entries: List[dict], q: str) -> List[dict]:
 
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
+    timer = metrics.RequestTimer('websearch')
     q = req.params.get('q')
     if not q and req.get_body():
         try:
@@ -43,7 +46,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             q = None
     q = validate_query(q)
     if not q:
-        return func.HttpResponse('Invalid or missing query', status_code=400)
-    results = search_entries(INDEX, q)
+        return timer.finish(func.HttpResponse('Invalid or missing query', status_code=400))
+    with timer.span('match'):
+        results = search_entries(INDEX, q)
     body = json.dumps(results[:20], ensure_ascii=False)
-    return func.HttpResponse(body, mimetype='application/json')
+    return timer.finish(func.HttpResponse(body, mimetype='application/json'))
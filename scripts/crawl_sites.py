@@ -6,6 +6,8 @@ import re
 import datetime
 from bs4 import BeautifulSoup
 
+from timing import StageTimer
+
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 OUTPUT = os.path.join(BASE_DIR, 'docs', 'crawl_index.json')
 PROMPT_PATH = os.path.join(BASE_DIR, '.github', 'models', 'summary.prompt.yaml')
@@ -14,6 +16,8 @@ SITES = [
     'https://github.blog'
 ]
 
+TIMER = StageTimer()
+
 
 def fetch_text(url: str) -> tuple[str, str]:
     resp = requests.get(url, timeout=10)
@@ -46,12 +50,15 @@ def run_slm(text: str) -> tuple[str, list[str]]:
             return summary, keywords
     except Exception as e:
         print('slm error', e)
+        TIMER.count('slm_errors')
     return '', []
 
 
 def crawl_site(url: str) -> dict:
-    title, text = fetch_text(url)
-    summary, keywords = run_slm(text)
+    with TIMER.stage('fetch'):
+        title, text = fetch_text(url)
+    with TIMER.stage('slm'):
+        summary, keywords = run_slm(text)
     return {
         'title': title,
         'url': url,
@@ -68,10 +75,12 @@ def main():
             entries.append(crawl_site(url))
         except Exception as e:
             print('crawl error', url, e)
+            TIMER.count('crawl_errors')
     os.makedirs(os.path.dirname(OUTPUT), exist_ok=True)
     with open(OUTPUT, 'w', encoding='utf-8') as f:
         json.dump(entries, f, ensure_ascii=False, indent=2)
     print(f'Wrote {len(entries)} entries to {OUTPUT}')
+    TIMER.write()
 
 
 if __name__ == '__main__':
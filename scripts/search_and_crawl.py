@@ -7,6 +7,8 @@ import re
 import subprocess
 from bs4 import BeautifulSoup
 
+from timing import StageTimer
+
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 CONCEPT_PATH = os.path.join(BASE_DIR, '.github', 'models', 'search_concepts.yaml')
 PROMPT_PATH = os.path.join(BASE_DIR, '.github', 'models', 'summary.prompt.yaml')
@@ -14,6 +16,8 @@ OUTPUT = os.path.join(BASE_DIR, 'data', 'web_summary.json')
 
 SEARCH_URL = 'https://duckduckgo.com/html/'
 
+TIMER = StageTimer()
+
 
 def load_concepts() -> list[str]:
     if not os.path.exists(CONCEPT_PATH):
@@ -72,20 +76,25 @@ def run_slm(text: str) -> tuple[str, list[str]]:
             return summary, keywords
     except Exception as e:
         print('slm error', e)
+        TIMER.count('slm_errors')
     return '', []
 
 
 def crawl_concept(concept: str) -> list[dict]:
     entries = []
     try:
-        urls = search_web(concept)
+        with TIMER.stage('search'):
+            urls = search_web(concept)
     except Exception as e:
         print('search error', concept, e)
+        TIMER.count('search_errors')
         return entries
     for url in urls:
         try:
-            title, text = fetch_text(url)
-            summary, keywords = run_slm(text)
+            with TIMER.stage('fetch'):
+                title, text = fetch_text(url)
+            with TIMER.stage('slm'):
+                summary, keywords = run_slm(text)
             entries.append({
                 'concept': concept,
                 'title': title,
@@ -96,6 +105,7 @@ def crawl_concept(concept: str) -> list[dict]:
             })
         except Exception as e:
             print('crawl error', url, e)
+            TIMER.count('crawl_errors')
     return entries
 
 
@@ -108,6 +118,7 @@ def main():
     with open(OUTPUT, 'w', encoding='utf-8') as f:
         json.dump(all_entries, f, ensure_ascii=False, indent=2)
     print(f'Wrote {len(all_entries)} entries to {OUTPUT}')
+    TIMER.write()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,65 @@
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+
+def percentile(values: List[float], p: float) -> float:
+    """nearest-rank 方式のパーセンタイル"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[k]
+
+
+class StageTimer:
+    """ビルドスクリプトのステージ毎の所要時間とカウンタを集計する"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations.setdefault(name, []).append(time.perf_counter() - start)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self, **extra) -> dict:
+        stages = {}
+        for name, values in self.durations.items():
+            total = sum(values)
+            stages[name] = {
+                'calls': len(values),
+                'total_s': round(total, 3),
+                'mean_ms': round(total / len(values) * 1000, 1),
+                'p50_ms': round(percentile(values, 50) * 1000, 1),
+                'p90_ms': round(percentile(values, 90) * 1000, 1),
+                'p99_ms': round(percentile(values, 99) * 1000, 1),
+            }
+        report = {
+            'elapsed_s': round(time.perf_counter() - self.start, 3),
+            'stages': stages,
+            'counters': dict(self.counters),
+        }
+        report.update(extra)
+        return report
+
+    def write(self, path: Optional[str] = None, **extra) -> dict:
+        """レポートを表示し、path（省略時は環境変数 TIMING_REPORT）があればJSONで保存"""
+        report = self.report(**extra)
+        print(json.dumps(report, ensure_ascii=False))
+        path = path or os.getenv('TIMING_REPORT')
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
@@ -1,10 +1,14 @@
 import os
 import json
 import glob
+import hashlib
+import numpy as np
 import pandas as pd
 import subprocess
 import re
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+from timing import StageTimer
 
 # Directory containing CSV files
 CSV_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'csv')
@@ -12,6 +16,20 @@ OUTPUT_JSON = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'docs', '
 
 PROMPT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.github', 'models', 'extract.prompt.yaml')
 
+TIMER = StageTimer()
+
+# Near-duplicate detection (MinHash + LSH over 記事本文)
+SHINGLE_SIZE = 5        # character n-gram size
+NUM_PERM = 128          # MinHash signature length
+LSH_BANDS = 16          # 16 bands x 8 rows -> candidate threshold ~0.7
+DEDUP_THRESHOLD = 0.9   # estimated Jaccard similarity to share a cluster_id
+MIN_DEDUP_CHARS = 30    # texts shorter than this after normalization are not clustered
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
 def fallback_summary(text: str) -> str:
     text = text.strip().replace('\n', ' ')
     return text[:120] + ("..." if len(text) > 120 else "")
@@ -32,11 +50,13 @@ def run_slm(text: str) -> Tuple[str, List[str]]:
     text = text.strip().replace('\n', ' ')
     if not text:
         return "", []
+    TIMER.count('slm_calls')
     try:
-        result = subprocess.run([
-            'gh', 'models', 'run', PROMPT_PATH,
-            '--var', f'text={text}'
-        ], check=True, capture_output=True, text=True)
+        with TIMER.stage('slm'):
+            result = subprocess.run([
+                'gh', 'models', 'run', PROMPT_PATH,
+                '--var', f'text={text}'
+            ], check=True, capture_output=True, text=True)
         out = result.stdout.strip()
         match = re.search(r'\{.*\}', out, re.DOTALL)
         if match:
@@ -48,13 +68,22 @@ def run_slm(text: str) -> Tuple[str, List[str]]:
             return summary, tags
     except Exception as e:
         print('gh models error', e)
+        TIMER.count('slm_errors')
     return "", []
 
 
-def extract_summary_and_tags(text: str) -> Tuple[str, List[str]]:
+def extract_summary_and_tags(text: str, cache: Optional[dict] = None) -> Tuple[str, List[str]]:
+    """Extract via the SLM, reusing a cached result only for identical text."""
+    key = text.strip()
+    if cache is not None and key in cache:
+        TIMER.count('slm_calls_saved')
+        return cache[key]
     summary, tags = run_slm(text)
     if summary or tags:
+        if cache is not None:
+            cache[key] = (summary, tags)
         return summary, tags
+    TIMER.count('fallbacks')
     return fallback_summary(text), fallback_tags(text)
 
 
@@ -74,13 +103,73 @@ def load_csv(path: str) -> pd.DataFrame:
     return pd.read_csv(path, encoding=enc)
 
 
+def normalize_text(text: str) -> str:
+    """Strip HTML tags, URLs and whitespace so markup does not dominate the shingles."""
+    text = re.sub(r'<[^>]+>', '', text)
+    text = re.sub(r'https?://\S+', '', text)
+    return re.sub(r'\s+', '', text)
+
+
+def shingles(text: str) -> set:
+    text = normalize_text(text)
+    if len(text) < MIN_DEDUP_CHARS:
+        return set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(items: set) -> np.ndarray:
+    hv = np.array([
+        int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little')
+        for s in items
+    ], dtype=np.uint64)
+    phv = ((PERM_A[:, None] * hv[None, :] + PERM_B[:, None]) % MERSENNE_PRIME) & MAX_HASH
+    return phv.min(axis=1)
+
+
+def cluster_duplicates(texts: List[str]) -> List[int]:
+    """Return, for each text, the index of the first text in its near-duplicate cluster."""
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    signatures = {}
+    for i, text in enumerate(texts):
+        items = shingles(text)
+        if items:
+            signatures[i] = minhash(items)
+
+    rows = NUM_PERM // LSH_BANDS
+    for band in range(LSH_BANDS):
+        buckets = {}
+        for i, sig in signatures.items():
+            key = sig[band * rows:(band + 1) * rows].tobytes()
+            buckets.setdefault(key, []).append(i)
+        for members in buckets.values():
+            for j in members[1:]:
+                for k in members:
+                    if k == j:
+                        break
+                    if np.mean(signatures[j] == signatures[k]) >= DEDUP_THRESHOLD:
+                        a, b = find(j), find(k)
+                        parent[max(a, b)] = min(a, b)
+                        break
+    return [find(i) for i in range(len(texts))]
+
+
 def build_index() -> list:
     entries = []
+    texts = []
     for file in sorted(glob.glob(os.path.join(CSV_DIR, '*.csv'))):
-        df = load_csv(file)
+        with TIMER.stage('load_csv'):
+            df = load_csv(file)
+        TIMER.count('csv_files')
         for i, row in df.iterrows():
-            article_text = str(row.get('記事本文', ''))
-            summary, tags = extract_summary_and_tags(article_text)
+            TIMER.count('rows')
+            texts.append(str(row.get('記事本文', '')))
             entry = {
                 'id': f"{os.path.basename(file)}-{i}",
                 'municipality': str(row.get('自治体名', '')),
@@ -88,21 +177,42 @@ def build_index() -> list:
                 'issue_title': str(row.get('発行号タイトル', '')),
                 'article_title': str(row.get('記事タイトル', '')),
                 'category': str(row.get('カテゴリ', '')),
-                'summary': summary,
-                'tags': tags,
+                'summary': '',
+                'tags': [],
                 'source': os.path.relpath(file, os.path.dirname(OUTPUT_JSON)),
-                'row': i + 1
+                'row': i + 1,
+                'cluster_id': ''
             }
             entries.append(entry)
+
+    with TIMER.stage('dedup'):
+        roots = cluster_duplicates(texts)
+    # Near-duplicates only share a cluster_id; an SLM result is reused only
+    # for identical text, so notices differing in e.g. dates keep their own summary.
+    cache = {}
+    for entry, text, root in zip(entries, texts, roots):
+        summary, tags = extract_summary_and_tags(text, cache)
+        entry['summary'] = summary
+        entry['tags'] = list(tags)
+        entry['cluster_id'] = entries[root]['id']
+    clusters = len(set(roots))
+    TIMER.count('clusters', clusters)
+    saved = TIMER.counters.get('slm_calls_saved', 0)
+    print(f"Dedup: {len(entries)} articles in {clusters} clusters, "
+          f"saved {saved} SLM calls on identical text")
     return entries
 
 
 def main():
-    entries = build_index()
+    with TIMER.stage('build_index'):
+        entries = build_index()
     os.makedirs(os.path.dirname(OUTPUT_JSON), exist_ok=True)
-    with open(OUTPUT_JSON, 'w', encoding='utf-8') as f:
-        json.dump(entries, f, ensure_ascii=False, indent=2)
+    with TIMER.stage('write'):
+        with open(OUTPUT_JSON, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
     print(f"Wrote {len(entries)} entries to {OUTPUT_JSON}")
+    build = TIMER.durations['build_index'][0]
+    TIMER.write(rows_per_sec=round(len(entries) / build, 2) if build else 0.0)
 
 
 if __name__ == '__main__':